@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""
+
+Bulk backfill CLI to regenerate meeting summaries (e.g. after a prompt or model change).
+
+Enumerates the `datalake/meeting-notes/*/event` objects, filters them by date,
+owner and title, and regenerates their summaries in a bounded pool:
+- Progress is appended to the JSONL file given with `--progress-file`, so an interrupted
+  run can be resumed by passing the same file (use a new file for a new backfill)
+- Emails are only sent again with `--send-email`
+- Throughput and estimated LLM cost are reported while it runs
+
+Example:
+    python3 backfill.py --since 2024-01-01 --until 2024-06-30 --owner roy@autohost.ai --workers 4 \
+        --progress-file backfill-2024-h1.jsonl
+
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+import traceback
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from libs.s3 import list_s3_objects, get_from_s3
+from libs.gdrive import get_file_emails
+from server import summarize_event, send_summary_email
+
+
+def parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def load_progress(path: str) -> set:
+    """
+    Returns the file IDs completed by previous runs
+
+    :param path: Path of the JSONL progress file
+    :return: Set of file IDs whose summary was regenerated
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            entry = json.loads(line)
+            if entry["status"] == "done":
+                done.add(entry["file_id"])
+    return done
+
+
+def load_event(file_id: str):
+    event = get_from_s3(file_id, "event")
+    return json.loads(event) if event is not None else None
+
+
+def matches_filters(event, owners: list, title_pattern: str) -> bool:
+    """
+    Returns True if the event passes the owner and title filters
+
+    :param event: Queued event stored in S3 (or None if it was not found)
+    :param owners: Only files owned by these emails (empty for all)
+    :param title_pattern: Only files with a title matching this regex (None for all)
+    :return: True if the file should be backfilled
+    """
+    if event is None:
+        return False
+    body = event["body"]
+    if len(owners) > 0 and body.get("owner_email") not in owners:
+        return False
+    if title_pattern is not None and re.search(title_pattern, body.get("title", "")) is None:
+        return False
+    return True
+
+
+def backfill_file(event: dict, send_email: bool) -> dict:
+    """
+    Regenerates the summary of one transcript
+
+    :param event: Queued event stored in S3
+    :param send_email: Send the new summary to the participants again
+    :return: Dict with the status, token usage and duration
+    """
+    started_at = time.time()
+    file_id = event["body"]["id"]
+    result = {"file_id": file_id, "status": "done", "input_tokens": 0, "output_tokens": 0, "emails": 0}
+    try:
+        text_header, summary, usage = summarize_event(event, force=True)
+        result.update(usage)
+
+        if send_email:
+            for participant_email in get_file_emails(file_id, event["body"]["owner_email"]):
+                send_summary_email(event, participant_email, text_header, summary)
+                result["emails"] += 1
+    except Exception as e:
+        print(f"Error backfilling document ID {file_id}: {e}")
+        traceback.print_exc()
+        result.update({"status": "error", "reason": f"{e}"})
+
+    result["seconds"] = round(time.time() - started_at, 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate meeting summaries for historical transcripts")
+    parser.add_argument("--since", type=parse_date, help="Only events queued on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--until", type=parse_date, help="Only events queued before this date (YYYY-MM-DD)")
+    parser.add_argument("--owner", action="append", default=[], help="Only files owned by this email (repeatable)")
+    parser.add_argument("--title", help="Only files with a title matching this regex")
+    parser.add_argument("--workers", type=int, default=4, help="Size of the pool")
+    parser.add_argument("--processes", action="store_true", help="Use a process pool instead of a thread pool")
+    parser.add_argument("--send-email", action="store_true", help="Send the new summaries to the participants")
+    parser.add_argument(
+        "--progress-file", required=True,
+        help="JSONL file to record progress in; pass the same file to resume, a new one for a new backfill"
+    )
+    parser.add_argument("--limit", type=int, help="Maximum number of files to process")
+    parser.add_argument("--dry-run", action="store_true", help="List the files that would be processed")
+    parser.add_argument("--input-price", type=float, default=3.0, help="USD per million input tokens")
+    parser.add_argument("--output-price", type=float, default=15.0, help="USD per million output tokens")
+    args = parser.parse_args()
+
+    # Enumerate the events, skipping files completed by a previous run
+    done = load_progress(args.progress_file)
+    file_ids = []
+    resumed = 0
+    for obj in list_s3_objects("event"):
+        if args.since is not None and obj["last_modified"] < args.since:
+            continue
+        if args.until is not None and obj["last_modified"] >= args.until:
+            continue
+        if obj["file_id"] in done:
+            resumed += 1
+            continue
+        file_ids.append(obj["file_id"])
+    if resumed > 0:
+        print(
+            f"Skipping {resumed} files already done in {args.progress_file}. "
+            f"Use a new --progress-file to regenerate them again."
+        )
+
+    # Apply the owner and title filters before the limit and the dry run
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        events = [
+            event for event in executor.map(load_event, file_ids)
+            if matches_filters(event, args.owner, args.title)
+        ]
+    if args.limit is not None:
+        events = events[:args.limit]
+    print(f"Found {len(events)} files to backfill")
+
+    if args.dry_run:
+        for event in events:
+            print(f"{event['body']['id']} {event['body'].get('owner_email')} {event['body'].get('title')}")
+        return
+
+    # Regenerate the summaries in a bounded pool
+    pool = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    totals = {"done": 0, "error": 0, "input_tokens": 0, "output_tokens": 0}
+    started_at = time.time()
+    with pool(max_workers=args.workers) as executor, open(args.progress_file, "a") as progress:
+        futures = [executor.submit(backfill_file, event, args.send_email) for event in events]
+        for i, future in enumerate(as_completed(futures)):
+            result = future.result()
+            progress.write(json.dumps(result) + "\n")
+            progress.flush()
+
+            totals[result["status"]] += 1
+            totals["input_tokens"] += result["input_tokens"]
+            totals["output_tokens"] += result["output_tokens"]
+            elapsed = time.time() - started_at
+            cost = totals["input_tokens"] / 1e6 * args.input_price + totals["output_tokens"] / 1e6 * args.output_price
+            print(
+                f"[{i + 1}/{len(futures)}] {result['status']} {result['file_id']} | "
+                f"{totals['done']} done, {totals['error']} errors | "
+                f"{(i + 1) / elapsed * 60:.1f} files/min | "
+                f"{totals['input_tokens']} in / {totals['output_tokens']} out tokens | ~${cost:.2f}"
+            )
+
+    print(f"Backfill finished in {time.time() - started_at:.0f}s: {json.dumps(totals)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""
+
+Compaction job that rolls up the per-file S3 text objects into date-partitioned archives.
+
+Every transcript writes several small `.txt` objects (event, summary, header, emails...).
+This job groups them by file ID into one record per file and writes them to
+`datalake/meeting-notes/archive/dt=YYYY-MM-DD/part-<run ID>-NNNN.jsonl.gz`:
+- Each record is a separate gzip member, so a single record can be read with a ranged GET
+- `archive/index.jsonl.gz` maps each file ID to its archive key, offset and length
+- Partitions are rewritten as a whole to new parts; the index is written next and the
+  old parts are deleted last, so readers never see offsets into rewritten bytes
+- Partitions that a record moved out of are rewritten too, so no record is archived twice
+
+The original objects are left in place. Use `get_from_archive` and `iter_archive`
+in `libs/s3.py` to read the archives.
+
+Example:
+    python3 compact.py --since 2024-01-01 --until 2024-07-01
+
+"""
+
+import os
+import gzip
+import json
+import argparse
+from datetime import datetime, timezone
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from libs.s3 import (
+    ARCHIVE_PREFIX, ARCHIVE_INDEX_KEY, get_s3_resource, get_from_s3, list_s3_objects, get_archive_index
+)
+
+
+# Shared state that changes all the time and has no stable partition date
+SKIPPED_RECORDS = ["ratelimit", "tokens"]
+SKIPPED_PREFIXES = ["checkpoints/"]
+RECORDS_PER_PART = 1000
+
+
+def get_record_date(objects: list) -> str:
+    # Use the date the event was queued, or the date of the latest object
+    events = [obj for obj in objects if obj["file_name"] == "event"]
+    last_modified = events[0]["last_modified"] if len(events) > 0 else max(obj["last_modified"] for obj in objects)
+    return last_modified.strftime("%Y-%m-%d")
+
+
+def list_partitions() -> dict:
+    """
+    Groups the objects stored by `upload_to_s3` into records, by partition date
+
+    :return: Dict of date to dict of record ID to list of objects
+    """
+    records = defaultdict(list)
+    for obj in list_s3_objects():
+        if obj["file_id"] in SKIPPED_RECORDS or any(obj["file_name"].startswith(p) for p in SKIPPED_PREFIXES):
+            continue
+        records[obj["file_id"]].append(obj)
+
+    partitions = defaultdict(dict)
+    for record_id, objects in records.items():
+        partitions[get_record_date(objects)][record_id] = objects
+    return partitions
+
+
+def get_dates_to_write(partitions: dict, index: dict, since=None, until=None) -> set:
+    """
+    Returns the partitions to rewrite: those in the date range, and those a record moved in or out of
+
+    A record moves when its date changes (e.g. the event was written again by a later webhook).
+    Its old partition is rewritten even outside the date range, so no stale copy is left behind.
+
+    :param partitions: Dict of date to dict of record ID to list of objects
+    :param index: Current archive index
+    :param since: First date to compact (YYYY-MM-DD, inclusive)
+    :param until: Last date to compact (YYYY-MM-DD, exclusive)
+    :return: Set of dates
+    """
+    dates = {
+        date for date in partitions
+        if (since is None or date >= since) and (until is None or date < until)
+    }
+    record_dates = {record_id: date for date, records in partitions.items() for record_id in records}
+    for record_id, entry in index.items():
+        if record_dates.get(record_id) != entry["date"]:
+            dates.add(entry["date"])
+            if record_id in record_dates:
+                dates.add(record_dates[record_id])
+    return dates
+
+
+def read_record(record_id: str, objects: list, date: str) -> dict:
+    return {
+        "file_id": record_id,
+        "date": date,
+        "objects": {obj["file_name"]: get_from_s3(record_id, obj["file_name"]) for obj in objects},
+        "last_modified": {obj["file_name"]: obj["last_modified"].isoformat() for obj in objects},
+    }
+
+
+def write_partition(date: str, records: list, run_id: str) -> list:
+    """
+    Writes the records of a partition to new part files named after the compaction run
+
+    Parts of previous runs are left in place until the new index is written, so readers
+    using the previous index keep reading valid bytes.
+
+    :param date: Partition date (YYYY-MM-DD)
+    :param records: List of records
+    :param run_id: ID of the compaction run, used in the part names
+    :return: List of index entries
+    """
+    bucket = get_s3_resource().Bucket(os.environ.get('S3_BUCKET'))
+    prefix = f"{ARCHIVE_PREFIX}/dt={date}/"
+    entries = []
+    records = sorted(records, key=lambda r: r["file_id"])
+    for part, start in enumerate(range(0, len(records), RECORDS_PER_PART)):
+        key = f"{prefix}part-{run_id}-{part:04d}.jsonl.gz"
+        members = []
+        offset = 0
+        for record in records[start:start + RECORDS_PER_PART]:
+            member = gzip.compress((json.dumps(record) + "\n").encode("utf-8"))
+            entries.append({
+                "file_id": record["file_id"],
+                "key": key,
+                "offset": offset,
+                "length": len(member),
+                "date": date,
+            })
+            members.append(member)
+            offset += len(member)
+        bucket.put_object(Key=key, Body=b"".join(members), ContentType='application/gzip')
+    return entries
+
+
+def delete_old_parts(dates: set, index: dict):
+    """
+    Deletes the parts of the given partitions that the index no longer points to
+
+    This includes parts of previous runs and parts left by a run that crashed before writing its index.
+
+    :param dates: Partition dates rewritten by this run
+    :param index: Index written by this run
+    :return: None
+    """
+    bucket = get_s3_resource().Bucket(os.environ.get('S3_BUCKET'))
+    keys = {entry["key"] for entry in index.values()}
+    for date in dates:
+        for obj in bucket.objects.filter(Prefix=f"{ARCHIVE_PREFIX}/dt={date}/"):
+            if obj.key not in keys:
+                obj.delete()
+
+
+def write_index(entries: dict):
+    lines = "".join(json.dumps(entry) + "\n" for entry in sorted(entries.values(), key=lambda e: e["file_id"]))
+    bucket = get_s3_resource().Bucket(os.environ.get('S3_BUCKET'))
+    bucket.put_object(Key=ARCHIVE_INDEX_KEY, Body=gzip.compress(lines.encode("utf-8")), ContentType='application/gzip')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the per-file S3 text objects into partitioned archives")
+    parser.add_argument("--since", help="First date to compact (YYYY-MM-DD, inclusive)")
+    parser.add_argument("--until", help="Last date to compact (YYYY-MM-DD, exclusive)")
+    parser.add_argument("--workers", type=int, default=16, help="Number of threads reading objects")
+    parser.add_argument("--dry-run", action="store_true", help="List the partitions that would be written")
+    args = parser.parse_args()
+
+    partitions = list_partitions()
+    index = dict(get_archive_index(max_age=0))
+    dates = get_dates_to_write(partitions, index, args.since, args.until)
+    print(f"Found {sum(len(partitions.get(d, {})) for d in dates)} records in {len(dates)} partitions to write")
+    if args.dry_run:
+        for date in sorted(dates):
+            print(f"dt={date}: {len(partitions.get(date, {}))} records")
+        return
+
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for date in sorted(dates):
+            records = list(executor.map(
+                lambda item: read_record(item[0], item[1], date),
+                partitions.get(date, {}).items()
+            ))
+            # Drop index entries of records that were in this partition before
+            index = {file_id: entry for file_id, entry in index.items() if entry["date"] != date}
+            for entry in write_partition(date, records, run_id):
+                index[entry["file_id"]] = entry
+            print(f"Compacted {len(records)} records into dt={date}")
+
+    # Switch readers to the new parts before removing the old ones
+    write_index(index)
+    print(f"Wrote index with {len(index)} records")
+    delete_old_parts(dates, index)
+
+
+if __name__ == "__main__":
+    main()
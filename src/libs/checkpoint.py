@@ -0,0 +1,74 @@
+import hashlib
+from .s3 import upload_to_s3, get_from_s3
+
+
+def content_hash(*parts: str) -> str:
+    """
+    Returns a short, stable hash of one or more strings
+
+    :param parts: Strings to hash (e.g. model name, prompt and input text)
+    :return: Hex digest
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(f"{part}".encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:16]
+
+
+def get_checkpoint_name(stage: str, key: str = None) -> str:
+    if key is None:
+        return f"checkpoints/{stage}"
+    return f"checkpoints/{stage}_{key}"
+
+
+def save_checkpoint(file_id: str, stage: str, content: str, key: str = None):
+    """
+    Saves the output of a processing stage next to the other objects of a file
+
+    :param file_id: Google Drive file ID
+    :param stage: Name of the stage (e.g. export, condensed)
+    :param content: Output of the stage
+    :param key: Content hash or Drive version of the stage input, if the output depends on it
+    :return: None
+    """
+    upload_to_s3(file_id, get_checkpoint_name(stage, key), content)
+
+
+def get_checkpoint(file_id: str, stage: str, key: str = None):
+    """
+    Gets the output of a processing stage saved by a previous attempt
+
+    :param file_id: Google Drive file ID
+    :param stage: Name of the stage (e.g. export, condensed)
+    :param key: Content hash or Drive version of the stage input, if the output depends on it
+    :return: Output of the stage or None if the stage has not completed
+    """
+    return get_from_s3(file_id, get_checkpoint_name(stage, key))
+
+
+def plan_resume(file_id: str, version: str) -> dict:
+    """
+    Finds which stages of the summary pipeline were completed by a previous attempt
+
+    The exported text is keyed by the Drive version of the file, so an edited document
+    is exported again. The condensed transcript is keyed by the hash of the exported text.
+
+    :param file_id: Google Drive file ID
+    :param version: Drive version of the file (None disables resuming)
+    :return: Dict with the outputs of the completed stages (None if not completed)
+    """
+    plan = {
+        "text": None,
+        "condensed": None,
+    }
+    if version is None:
+        return plan
+
+    plan["text"] = get_checkpoint(file_id, "export", version)
+    if plan["text"] is not None:
+        plan["condensed"] = get_checkpoint(file_id, "condensed", content_hash(plan["text"]))
+
+    completed = [stage for stage in ["text", "condensed"] if plan[stage] is not None]
+    print(f"Resuming document ID {file_id} version {version} with completed stages: {completed}")
+    return plan
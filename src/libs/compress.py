@@ -0,0 +1,151 @@
+import os
+import re
+import zlib
+import numpy as np
+from .tokens import num_tokens_from_string
+
+
+# Compression presets, from no compression to aggressive trimming
+COMPRESSION_LEVELS = {
+    "off": None,
+    "light": {
+        "remove_fillers": True,
+        "max_backchannel_words": 4,
+        "similarity_threshold": 0.9,
+        "window": 30,
+        "cross_speaker": False,
+    },
+    "aggressive": {
+        "remove_fillers": True,
+        "max_backchannel_words": 6,
+        "similarity_threshold": 0.7,
+        "window": 200,
+        "cross_speaker": True,
+    },
+}
+DEFAULT_COMPRESSION_LEVEL = os.environ.get("TRANSCRIPT_COMPRESSION", "light")
+if DEFAULT_COMPRESSION_LEVEL not in COMPRESSION_LEVELS:
+    print(f"WARNING: Unknown TRANSCRIPT_COMPRESSION {DEFAULT_COMPRESSION_LEVEL}, using light")
+    DEFAULT_COMPRESSION_LEVEL = "light"
+
+FILLER_PATTERN = re.compile(r"(?:,\s*)?\b(?:um+|uh+|uhm+|erm+|hmm+|mm+-?hmm+)\b,?", re.IGNORECASE)
+# "You know," and "I mean," are only fillers at the start of a clause ("Do you know, whether..." is a question)
+CLAUSE_FILLER_PATTERN = re.compile(r"(?:^|(?<=[.!?,;]\s))(?:you know|i mean),\s*", re.IGNORECASE)
+# Only stutters of three or more are collapsed, "they had had concerns" is left alone
+REPEATED_WORD_PATTERN = re.compile(r"\b(\w+)(?:[,\s]+\1\b){2,}", re.IGNORECASE)
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+BACKCHANNEL_WORDS = {
+    "yeah", "yes", "yep", "yup", "okay", "ok", "right", "sure", "cool", "great",
+    "nice", "got", "it", "sounds", "good", "perfect", "exactly", "totally", "absolutely", "alright",
+    "all", "thanks", "thank", "you", "so", "oh", "ah", "wow", "true", "makes", "sense", "awesome",
+}
+
+NUM_PERMUTATIONS = 64
+SHINGLE_SIZE = 3
+MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(42)
+_PERMUTATION_A = _rng.integers(1, MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERMUTATION_B = _rng.integers(0, MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def remove_fillers(text: str) -> str:
+    text = FILLER_PATTERN.sub(" ", text)
+    text = CLAUSE_FILLER_PATTERN.sub("", text.strip())
+    text = REPEATED_WORD_PATTERN.sub(r"\1", text)
+    return re.sub(r"\s+([,.!?])", r"\1", re.sub(r"\s{2,}", " ", text)).strip()
+
+
+def is_backchannel(text: str, max_words: int) -> bool:
+    words = WORD_PATTERN.findall(text.lower())
+    return len(words) <= max_words and all(word in BACKCHANNEL_WORDS for word in words)
+
+
+def minhash_signatures(sentences: list) -> np.ndarray:
+    """
+    Computes MinHash signatures of the word shingles of each sentence
+
+    :param sentences: List of sentences
+    :return: Array of shape (len(sentences), NUM_PERMUTATIONS)
+    """
+    signatures = np.full((len(sentences), NUM_PERMUTATIONS), MERSENNE_PRIME, dtype=np.uint64)
+    for i, sentence in enumerate(sentences):
+        words = WORD_PATTERN.findall(sentence.lower())
+        shingles = {" ".join(words[j:j + SHINGLE_SIZE]) for j in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+        # (a * h + b) mod p for every permutation and shingle, then the minimum per permutation
+        permuted = (np.outer(_PERMUTATION_A, hashes) + _PERMUTATION_B[:, None]) % MERSENNE_PRIME
+        signatures[i] = permuted.min(axis=1)
+    return signatures
+
+
+def compress_transcript(transcript: str, level: str = None):
+    """
+    Removes filler words, backchannel turns and near-duplicate sentences from a condensed transcript
+
+    :param transcript: Condensed transcript with one "Speaker: text" turn per line
+    :param level: Compression level in COMPRESSION_LEVELS (defaults to TRANSCRIPT_COMPRESSION or "light")
+    :return: Tuple of (compressed transcript, stats)
+    """
+    config = COMPRESSION_LEVELS[level or DEFAULT_COMPRESSION_LEVEL]
+    if config is None:
+        return transcript, {"input_tokens": None, "output_tokens": None, "reduction": 0.0}
+
+    # Split the turns into speakers and sentences
+    turns = []
+    for line in transcript.splitlines():
+        speaker, text = line.split(": ", 1) if ": " in line else (None, line)
+        if config["remove_fillers"]:
+            text = remove_fillers(text)
+        if text == "" or is_backchannel(text, config["max_backchannel_words"]):
+            continue
+        turns.append((speaker, SENTENCE_PATTERN.split(text)))
+
+    # Drop sentences that are near-duplicates of a recent sentence
+    sentences = [sentence for _, turn_sentences in turns for sentence in turn_sentences]
+    speakers = np.array([f"{speaker}" for speaker, turn_sentences in turns for _ in turn_sentences])
+    signatures = minhash_signatures(sentences)
+    keep = np.ones(len(sentences), dtype=bool)
+    for i in range(1, len(sentences)):
+        # Very short sentences have too few shingles for a meaningful estimate
+        if len(WORD_PATTERN.findall(sentences[i])) < SHINGLE_SIZE + 1:
+            continue
+        start = max(0, i - config["window"])
+        candidates = keep[start:i]
+        # Unless cross_speaker is set, only a speaker repeating themselves is collapsed
+        if not config["cross_speaker"]:
+            candidates = candidates & (speakers[start:i] == speakers[i])
+        previous = np.flatnonzero(candidates) + start
+        if len(previous) == 0:
+            continue
+        similarity = (signatures[previous] == signatures[i]).mean(axis=1)
+        if similarity.max() >= config["similarity_threshold"]:
+            keep[i] = False
+
+    # Rebuild the turns from the kept sentences
+    lines = []
+    previous_speaker = None
+    index = 0
+    for speaker, turn_sentences in turns:
+        kept = [s for j, s in enumerate(turn_sentences) if keep[index + j]]
+        index += len(turn_sentences)
+        if len(kept) == 0:
+            continue
+        text = " ".join(kept)
+        # Merge turns from the same speaker that were split by a removed turn
+        if speaker is not None and speaker == previous_speaker:
+            lines[-1] += " " + text
+        else:
+            lines.append(f"{speaker}: {text}" if speaker is not None else text)
+        previous_speaker = speaker
+    compressed = "\n".join(lines)
+
+    input_tokens = num_tokens_from_string(transcript, "gpt-4o")
+    output_tokens = num_tokens_from_string(compressed, "gpt-4o")
+    stats = {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "reduction": 1 - output_tokens / input_tokens if input_tokens > 0 else 0.0,
+    }
+    print(f"Compressed transcript from {input_tokens} to {output_tokens} tokens ({stats['reduction']:.1%} reduction)")
+    return compressed, stats
@@ -2,12 +2,14 @@ import os
 import io
 import json
 from datetime import datetime
+from functools import lru_cache
 from urllib.parse import quote_plus
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
 from .s3 import upload_to_s3, get_from_s3
+from .ratelimit import rate_limited
 
 
 credentials_path = "credentials.json"
@@ -16,6 +18,23 @@ SCOPES = [
 ]
 
 
+@lru_cache(maxsize=None)
+def get_delegated_credentials(user_email):
+    """
+    Loads the service account credentials delegated to a user, once per process
+
+    The credentials keep their access token, so warm workers don't refresh it on every call.
+
+    :param user_email: Email of the user to delegate the credentials to
+    :return: Delegated credentials
+    """
+    creds = service_account.Credentials.from_service_account_file(
+        credentials_path,
+        scopes=SCOPES
+    )
+    return creds.with_subject(user_email)
+
+
 def get_drive_change_events(user_email, change_id):
     """
     Gets the change event for a user
@@ -25,13 +44,8 @@ def get_drive_change_events(user_email, change_id):
     :return: Change event object
     """
 
-    # Load the credentials
-    creds = service_account.Credentials.from_service_account_file(
-        credentials_path,
-        scopes=SCOPES
-    )
-    # Delegate the credentials
-    delegated_credentials = creds.with_subject(user_email)
+    # Load the credentials delegated to the user
+    delegated_credentials = get_delegated_credentials(user_email)
     # Build the service
     service = build('drive', 'v3', credentials=delegated_credentials)
     # Get the page token
@@ -41,7 +55,7 @@ def get_drive_change_events(user_email, change_id):
         page_token = change_id
     if page_token is None:
         print(f"Page token not found for user {user_email}, getting start page token")
-        response = service.changes().getStartPageToken().execute()
+        response = rate_limited('gdrive', service.changes().getStartPageToken().execute)
         page_token = response.get('startPageToken')
     # Set default event object
     event = {}
@@ -49,7 +63,7 @@ def get_drive_change_events(user_email, change_id):
     # Iterate over changes to find a new Google Doc that has '- Transcript' in the title
     while page_token is not None:
         # Get the change event
-        change_event = service.changes().list(pageToken=page_token).execute()
+        change_event = rate_limited('gdrive', service.changes().list(pageToken=page_token).execute)
         print(f"Processing ChangeID {change_id} containing {len(change_event['changes'])} events for user {user_email}: {json.dumps(change_event)}")
         for change in change_event['changes']:
             if (
@@ -96,24 +110,19 @@ def renew_drive_webhook_for_user(user_email, webhook_url=None):
         print("WEBHOOK_URL not set")
         return
 
-    # Load the credentials
-    creds = service_account.Credentials.from_service_account_file(
-        credentials_path,
-        scopes=SCOPES
-    )
-    # Delegate the credentials
-    delegated_credentials = creds.with_subject(user_email)
+    # Load the credentials delegated to the user
+    delegated_credentials = get_delegated_credentials(user_email)
     # Build the service
     service = build('drive', 'v3', credentials=delegated_credentials)
     # Get the page token
     page_token = get_from_s3(f"tokens/{user_email.split('@')[0]}", 'page_token')
     if page_token is None:
-        response = service.changes().getStartPageToken().execute()
+        response = rate_limited('gdrive', service.changes().getStartPageToken().execute)
         page_token = response.get('startPageToken')
     # Register the webhook
     try:
         unix_milliseconds_hour_from_now = int((datetime.now().timestamp() + 3600) * 1000)
-        response = service.changes().watch(
+        response = rate_limited('gdrive', service.changes().watch(
             pageToken=page_token,
             body={
                 'id': f'{unix_milliseconds_hour_from_now}-meeting-transcripts-{user_email.split("@")[0].replace(".", "_")}',
@@ -122,7 +131,7 @@ def renew_drive_webhook_for_user(user_email, webhook_url=None):
                 'token': quote_plus(user_email),
                 'expiration': unix_milliseconds_hour_from_now,
             }
-        ).execute()
+        ).execute)
         print(f"Registered Google Drive webhook for user {user_email}: {response}")
         return response
     except HttpError as error:
@@ -157,17 +166,12 @@ def export_text(file_id, user_email):
     :param user_email: User email to delegate the credentials to
     :return: Plain text
     """
-    creds = service_account.Credentials.from_service_account_file(
-        credentials_path,
-        scopes=SCOPES
-    )
-
     # Remove +abc from user+abc@domain.tld (in user_email)
     if '+' in user_email:
         user_email = user_email.split('+')[0] + '@' + user_email.split('@')[1]
 
     # Delegate the credentials
-    delegated_credentials = creds.with_subject(user_email)
+    delegated_credentials = get_delegated_credentials(user_email)
 
     try:
         # create drive api client
@@ -180,7 +184,7 @@ def export_text(file_id, user_email):
         downloader = MediaIoBaseDownload(file, request)
         done = False
         while done is False:
-            status, done = downloader.next_chunk()
+            status, done = rate_limited('gdrive', downloader.next_chunk)
             print(F'Document {file_id} download progress: {int(status.progress() * 100)}%')
 
     except HttpError as error:
@@ -190,6 +194,35 @@ def export_text(file_id, user_email):
     return file.getvalue()
 
 
+def get_file_version(file_id: str, user_email: str):
+    """
+    Returns the version of a file, which changes every time the file is modified
+
+    :param file_id: Google Drive file ID
+    :param user_email: User's email address
+    :return: Version number as a string, or None if it could not be read
+    """
+
+    # Remove +abc from user+abc@domain.tld (in user_email)
+    if '+' in user_email:
+        user_email = user_email.split('+')[0] + '@' + user_email.split('@')[1]
+
+    # Delegate the credentials
+    delegated_credentials = get_delegated_credentials(user_email)
+
+    try:
+        # create drive api client
+        service = build('drive', 'v3', credentials=delegated_credentials)
+
+        # pylint: disable=maybe-no-member
+        request = service.files().get(fileId=file_id, fields='version')
+        return rate_limited('gdrive', request.execute).get('version')
+
+    except HttpError as error:
+        print(F'An error occurred getting the version of document {file_id}: {error}')
+        return None
+
+
 def get_file_permissions(file_id: str, user_email: str) -> list:
     """
     Return a lis of permissions for a file that include other user email addresses
@@ -199,17 +232,12 @@ def get_file_permissions(file_id: str, user_email: str) -> list:
     :return: List of permissions
     """
 
-    creds = service_account.Credentials.from_service_account_file(
-        credentials_path,
-        scopes=SCOPES
-    )
-
     # Remove +abc from user+abc@domain.tld (in user_email)
     if '+' in user_email:
         user_email = user_email.split('+')[0] + '@' + user_email.split('@')[1]
 
     # Delegate the credentials
-    delegated_credentials = creds.with_subject(user_email)
+    delegated_credentials = get_delegated_credentials(user_email)
 
     try:
         # create drive api client
@@ -221,7 +249,7 @@ def get_file_permissions(file_id: str, user_email: str) -> list:
             includePermissionsForView='published',
             fields='permissions(id, emailAddress, displayName, role, type)'
         )
-        permissions = request.execute().get('permissions', [])
+        permissions = rate_limited('gdrive', request.execute).get('permissions', [])
         return permissions
 
     except HttpError as error:
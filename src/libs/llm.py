@@ -1,10 +1,14 @@
+from functools import lru_cache
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from .tokens import num_tokens_from_string
 from .prompt_hub import get_prompt
+from .ratelimit import rate_limited
 
 
+CHUNK_SUMMARY_MODEL = "gpt-4o"
+
 
 def condense_transcript(transcript, attendee_list):
     condensed_text = ""
@@ -47,7 +51,7 @@ def condense_transcript(transcript, attendee_list):
     return condensed_text.strip()
 
 
-def summarize_text(text: str, max_tokens: int = 4000) -> str:
+def get_chunk_summary_prompt() -> str:
     system = "\n".join([
         "You are a meeting assistant who is an expert in summarizing meeting transcripts.",
         "Your specialty is to summarize chunks of lines of text from a meeting transcript generated by a computer that may contain errors.",
@@ -62,13 +66,26 @@ def summarize_text(text: str, max_tokens: int = 4000) -> str:
         "Summarize the transcript above.",
     ])
     system_prompt = get_prompt("meeting-transcript-chunk-summary-agent")
+    return system_prompt if system_prompt != "" else system
+
+
+@lru_cache(maxsize=None)
+def get_chunk_summary_model(max_tokens: int = 4000) -> ChatOpenAI:
+    # Keep one client per process so warm workers reuse its HTTP connections.
+    # Retries are left to `rate_limited`, so a 429 pauses every worker right away
+    return ChatOpenAI(model=CHUNK_SUMMARY_MODEL, max_tokens=max_tokens, max_retries=0)
+
+
+def summarize_text(text: str, max_tokens: int = 4000) -> str:
+    system_prompt = get_chunk_summary_prompt()
 
-    prompt = ChatPromptTemplate.from_template(system_prompt if system_prompt != "" else system)
-    model = ChatOpenAI(model="gpt-4o", max_tokens=max_tokens)
+    prompt = ChatPromptTemplate.from_template(system_prompt)
+    model = get_chunk_summary_model(max_tokens)
     output_parser = StrOutputParser()
     chain = prompt | model | output_parser
 
-    response = chain.invoke({"transcript": text})
+    tokens = num_tokens_from_string(system_prompt + text, CHUNK_SUMMARY_MODEL)
+    response = rate_limited("openai", chain.invoke, {"transcript": text}, tokens=tokens)
     return response
 
 
@@ -1,7 +1,13 @@
 import os
+import time
 import requests
 
 
+# Prompts are cached for the life of the process, but refreshed after PROMPT_CACHE_TTL seconds
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", 300))
+_cache = {}
+
+
 def get_prompt(name: str) -> str:
     """
     Gets a prompt from the Prompt Hub
@@ -9,6 +15,9 @@ def get_prompt(name: str) -> str:
     :param name: Name of the prompt to get
     :return: Prompt text
     """
+    if name in _cache and time.time() - _cache[name][1] < PROMPT_CACHE_TTL:
+        return _cache[name][0]
+
     url = f"https://api.ops.autohost.ai/prompt-hub/agents/{name}"
     api_key = os.getenv("PROMPT_HUB_API_KEY")
     headers = {
@@ -17,7 +26,10 @@ def get_prompt(name: str) -> str:
     try:
         response = requests.get(url, headers=headers)
         response.raise_for_status()
-        return response.json()["data"]["prompt"]
+        prompt = response.json()["data"]["prompt"]
+        _cache[name] = (prompt, time.time())
+        return prompt
     except requests.RequestException as e:
         print(f"Error getting prompt from Prompt Hub: {e}")
-        return ""
+        # Fall back to the last prompt we got, if any
+        return _cache[name][0] if name in _cache else ""
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import random
+import threading
+from .s3 import get_from_s3_with_etag, put_to_s3_if_match
+
+
+# Requests and tokens per minute for each provider (None disables the budget), the maximum
+# in-flight calls per process and the latency above which a call counts as slow
+RATE_LIMITS = {
+    "openai": {
+        "requests": int(os.environ.get("OPENAI_REQUESTS_PER_MINUTE", 500)),
+        "tokens": int(os.environ.get("OPENAI_TOKENS_PER_MINUTE", 30000)),
+        "concurrency": int(os.environ.get("OPENAI_MAX_CONCURRENCY", 8)),
+        "target_latency": float(os.environ.get("OPENAI_TARGET_LATENCY_SECONDS", 120)),
+    },
+    "anthropic": {
+        "requests": int(os.environ.get("ANTHROPIC_REQUESTS_PER_MINUTE", 50)),
+        "tokens": int(os.environ.get("ANTHROPIC_TOKENS_PER_MINUTE", 30000)),
+        "concurrency": int(os.environ.get("ANTHROPIC_MAX_CONCURRENCY", 4)),
+        "target_latency": float(os.environ.get("ANTHROPIC_TARGET_LATENCY_SECONDS", 300)),
+    },
+    "gdrive": {
+        "requests": int(os.environ.get("GDRIVE_REQUESTS_PER_MINUTE", 600)),
+        "tokens": None,
+        "concurrency": int(os.environ.get("GDRIVE_MAX_CONCURRENCY", 16)),
+        "target_latency": float(os.environ.get("GDRIVE_TARGET_LATENCY_SECONDS", 30)),
+    },
+}
+
+MAX_RETRIES = 5
+MAX_WAIT_SECONDS = 5.0
+# Calls proceed without a token after this long, so a broken backend can't stall every call
+MAX_ACQUIRE_SECONDS = float(os.environ.get("RATE_LIMIT_MAX_ACQUIRE_SECONDS", 120))
+
+
+class InMemoryBackend:
+    """
+    Keeps the bucket state in process memory (for tests and single-process runs)
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def update(self, name, fn):
+        with self.lock:
+            state, result = fn(self.states.get(name))
+            self.states[name] = state
+            return result
+
+
+class S3Backend:
+    """
+    Keeps the bucket state in an S3 object shared by all concurrent workers
+
+    Updates are a read-modify-write guarded by the object's ETag, so concurrent
+    workers never spend the same tokens twice.
+    """
+
+    def __init__(self, prefix="ratelimit", max_attempts=10):
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+
+    def update(self, name, fn):
+        for attempt in range(self.max_attempts):
+            content, etag = get_from_s3_with_etag(self.prefix, name)
+            state, result = fn(json.loads(content) if content is not None else None)
+            if put_to_s3_if_match(self.prefix, name, json.dumps(state), etag):
+                return result
+            time.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+        # Too much contention, ask the caller to wait a bit before trying again
+        return random.uniform(0.1, 0.5)
+
+
+def get_backend():
+    backend = os.environ.get("RATE_LIMIT_BACKEND", "s3" if os.environ.get("S3_BUCKET") else "memory")
+    if backend == "s3":
+        return S3Backend()
+    return InMemoryBackend()
+
+
+def _refill(state, limits, now):
+    if state is None:
+        state = {
+            "requests": limits["requests"],
+            "tokens": limits["tokens"],
+            "updated_at": now,
+            "blocked_until": 0,
+        }
+    elapsed = max(0.0, now - state["updated_at"])
+    for budget in ["requests", "tokens"]:
+        if limits[budget] is not None:
+            capacity = limits[budget]
+            state[budget] = min(capacity, (state.get(budget) or 0) + elapsed * capacity / 60)
+    state["updated_at"] = now
+    return state
+
+
+def _take(limits, cost, now):
+    """
+    Returns a function that takes `cost` from the bucket, or computes how long to wait for it
+    """
+    def fn(state):
+        state = _refill(state, limits, now)
+        wait = max(0.0, state.get("blocked_until", 0) - now)
+        for budget in ["requests", "tokens"]:
+            if limits[budget] is None:
+                continue
+            # A call larger than the bucket is allowed once the bucket is full
+            amount = min(cost[budget], limits[budget])
+            if state[budget] < amount:
+                wait = max(wait, (amount - state[budget]) * 60 / limits[budget])
+        if wait == 0:
+            for budget in ["requests", "tokens"]:
+                if limits[budget] is not None:
+                    state[budget] -= min(cost[budget], limits[budget])
+        return state, wait
+    return fn
+
+
+def _block(limits, seconds, now):
+    """
+    Returns a function that pauses the bucket for every worker after a 429
+    """
+    def fn(state):
+        state = _refill(state, limits, now)
+        state["blocked_until"] = max(state.get("blocked_until", 0), now + seconds)
+        return state, None
+    return fn
+
+
+class TokenBucket:
+    """
+    Token bucket budgeted by requests and tokens per minute
+    """
+
+    def __init__(self, name, limits, backend):
+        self.name = name
+        self.limits = limits
+        self.backend = backend
+
+    def acquire(self, tokens=0):
+        cost = {"requests": 1, "tokens": tokens}
+        started_at = time.time()
+        while True:
+            try:
+                wait = self.backend.update(self.name, _take(self.limits, cost, time.time()))
+            except Exception as e:
+                print(f"WARNING: Rate limiter backend failed for {self.name}, proceeding without a token: {e}")
+                return
+            if wait == 0:
+                return
+            if time.time() - started_at + wait > MAX_ACQUIRE_SECONDS:
+                print(f"WARNING: Waited too long for a {self.name} token, proceeding without one")
+                return
+            print(f"Rate limit reached for {self.name}, waiting {wait:.1f}s")
+            time.sleep(min(wait, MAX_WAIT_SECONDS))
+
+    def block(self, seconds):
+        try:
+            self.backend.update(self.name, _block(self.limits, seconds, time.time()))
+        except Exception as e:
+            print(f"WARNING: Rate limiter backend failed to pause {self.name}: {e}")
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits in-flight calls using additive increase / multiplicative decrease
+
+    The limit shrinks by half on a 429 and by 10% when latency exceeds the target,
+    and grows by about one slot per limit-worth of fast successful calls.
+
+    The limit is per process. It only has an effect when a process makes concurrent calls
+    (e.g. worker.py); a Lambda worker makes one call at a time and relies on the shared bucket.
+    """
+
+    def __init__(self, max_limit, target_latency, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.target_latency = target_latency
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, throttled=False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit / 2)
+            elif latency is not None and latency > self.target_latency:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+def is_throttled(error: Exception) -> bool:
+    """
+    Returns True if the error is a 429 from OpenAI, Anthropic or Google Drive
+    """
+    status = getattr(error, "status_code", None)
+    if status is None and hasattr(error, "resp"):
+        status = getattr(error.resp, "status", None)
+    if status is not None and int(status) == 429:
+        return True
+    # Google Drive reports user rate limits as 403 rateLimitExceeded
+    return status is not None and int(status) == 403 and "rateLimitExceeded" in f"{error}"
+
+
+_buckets = {}
+_limiters = {}
+_lock = threading.Lock()
+
+
+def get_limiters(provider):
+    with _lock:
+        if provider not in _buckets:
+            limits = RATE_LIMITS[provider]
+            _buckets[provider] = TokenBucket(provider, limits, get_backend())
+            _limiters[provider] = AdaptiveConcurrencyLimiter(limits["concurrency"], limits["target_latency"])
+        return _buckets[provider], _limiters[provider]
+
+
+def rate_limited(provider, fn, *args, tokens=0, **kwargs):
+    """
+    Calls a function within the rate limits of a provider, retrying throttled calls
+
+    :param provider: Name of the provider in RATE_LIMITS (openai, anthropic or gdrive)
+    :param fn: Function that makes the outbound call
+    :param tokens: Estimated number of tokens used by the call
+    :return: Return value of the function
+    """
+    bucket, limiter = get_limiters(provider)
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire(tokens)
+        limiter.acquire()
+        started_at = time.time()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            throttled = is_throttled(e)
+            limiter.release(throttled=throttled)
+            if not throttled or attempt == MAX_RETRIES:
+                raise
+            backoff = min(60, 2 ** attempt) + random.uniform(0, 1)
+            print(f"Throttled by {provider} (attempt {attempt + 1}), backing off {backoff:.1f}s: {e}")
+            bucket.block(backoff)
+            continue
+        limiter.release(latency=time.time() - started_at)
+        return result
@@ -1,9 +1,24 @@
 import boto3
+from botocore.exceptions import ClientError
 import os
+import gzip
+import json
+import time
+import threading
+
+
+# boto3 resources are not thread-safe, so keep one per thread for the life of the process
+_local = threading.local()
+
+
+def get_s3_resource():
+    if not hasattr(_local, 's3'):
+        _local.s3 = boto3.resource('s3')
+    return _local.s3
 
 
 def upload_to_s3(file_id, file_name, file_content):
-    s3 = boto3.resource('s3')
+    s3 = get_s3_resource()
     key = f"datalake/meeting-notes/{file_id}/{file_name}.txt"
     bucket = os.environ.get('S3_BUCKET')
     s3.Bucket(bucket).put_object(
@@ -14,10 +29,207 @@ def upload_to_s3(file_id, file_name, file_content):
 
 
 def get_from_s3(file_id, file_name):
-    s3 = boto3.resource('s3')
+    s3 = get_s3_resource()
     key = f"datalake/meeting-notes/{file_id}/{file_name}.txt"
     try:
         obj = s3.Object(os.environ.get('S3_BUCKET'), key)
         return obj.get()['Body'].read().decode('utf-8')
     except Exception as e:
         return None
+
+
+def get_from_s3_with_etag(file_id, file_name):
+    """
+    Gets an object from S3 together with its ETag, for conditional writes
+
+    :param file_id: Google Drive file ID (or prefix)
+    :param file_name: Name of the object
+    :return: Tuple of (content, etag), or (None, None) if the object does not exist
+    """
+    s3 = get_s3_resource()
+    key = f"datalake/meeting-notes/{file_id}/{file_name}.txt"
+    try:
+        obj = s3.Object(os.environ.get('S3_BUCKET'), key)
+        response = obj.get()
+        return response['Body'].read().decode('utf-8'), response['ETag']
+    except ClientError as e:
+        # Without s3:ListBucket, S3 returns AccessDenied for a missing object.
+        # Any other error (SlowDown, InternalError...) must not look like a missing object
+        if e.response.get('Error', {}).get('Code') in ['NoSuchKey', 'AccessDenied']:
+            return None, None
+        raise
+
+
+def put_to_s3_if_match(file_id, file_name, file_content, etag=None) -> bool:
+    """
+    Writes an object to S3 only if it was not modified since it was read
+
+    :param file_id: Google Drive file ID (or prefix)
+    :param file_name: Name of the object
+    :param file_content: Content of the object
+    :param etag: ETag returned by `get_from_s3_with_etag`, or None if the object must not exist yet
+    :return: True if the object was written, False if another writer changed it first
+    """
+    s3 = get_s3_resource()
+    key = f"datalake/meeting-notes/{file_id}/{file_name}.txt"
+    bucket = os.environ.get('S3_BUCKET')
+    condition = {'IfMatch': etag} if etag is not None else {'IfNoneMatch': '*'}
+    try:
+        s3.Bucket(bucket).put_object(
+            Key=key,
+            Body=file_content,
+            ContentType='text/plain',
+            **condition
+        )
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ['PreconditionFailed', 'ConditionalRequestConflict']:
+            return False
+        raise
+
+
+def list_s3_objects(file_name=None):
+    """
+    Lists the objects stored by `upload_to_s3`
+
+    :param file_name: Only list objects with this name (e.g. event)
+    :return: Generator of dicts with file_id, file_name, last_modified and size
+    """
+    prefix = "datalake/meeting-notes/"
+    bucket = get_s3_resource().Bucket(os.environ.get('S3_BUCKET'))
+    for obj in bucket.objects.filter(Prefix=prefix):
+        path = obj.key[len(prefix):]
+        if not path.endswith(".txt") or "/" not in path:
+            continue
+        file_id, name = path[:-len(".txt")].split("/", 1)
+        if file_name is not None and name != file_name:
+            continue
+        yield {
+            "file_id": file_id,
+            "file_name": name,
+            "last_modified": obj.last_modified,
+            "size": obj.size,
+        }
+
+
+ARCHIVE_PREFIX = "datalake/meeting-notes/archive"
+ARCHIVE_INDEX_KEY = f"{ARCHIVE_PREFIX}/index.jsonl.gz"
+_archive_index = {"loaded_at": 0, "entries": None}
+
+
+def split_archive_path(file_id, file_name):
+    """
+    Returns the archive record ID and object name of an object stored by `upload_to_s3`
+
+    Objects are grouped by the first segment of their path (the Google Drive file ID), so
+    `<file_id>` + `summary` is stored as `summary` in the `<file_id>` record.
+    Drive page tokens (`tokens/...`) and rate limit state are not archived (see compact.py).
+    """
+    record_id, name = f"{file_id}/{file_name}".split("/", 1)
+    return record_id, name
+
+
+def get_archive_index(max_age=300):
+    """
+    Loads the archive index (record ID -> archive location), cached for `max_age` seconds
+
+    :param max_age: Seconds before the index is read from S3 again
+    :return: Dict of record ID to dict with key, offset, length and date
+    """
+    if _archive_index["entries"] is None or time.time() - _archive_index["loaded_at"] > max_age:
+        entries = {}
+        try:
+            obj = get_s3_resource().Object(os.environ.get('S3_BUCKET'), ARCHIVE_INDEX_KEY)
+            data = gzip.decompress(obj.get()['Body'].read()).decode('utf-8')
+            for line in data.splitlines():
+                entry = json.loads(line)
+                entries[entry['file_id']] = entry
+        except ClientError as e:
+            # Without s3:ListBucket (e.g. the Lambda role), S3 returns AccessDenied for a missing object
+            if e.response.get('Error', {}).get('Code') not in ['NoSuchKey', 'AccessDenied']:
+                raise
+        _archive_index.update({"loaded_at": time.time(), "entries": entries})
+    return _archive_index["entries"]
+
+
+def read_archive_entry(entry):
+    """
+    Reads the record an index entry points to, or None if its bytes are gone or are another record
+
+    :param entry: Index entry with key, offset and length
+    :return: Record dict or None
+    """
+    obj = get_s3_resource().Object(os.environ.get('S3_BUCKET'), entry['key'])
+    byte_range = f"bytes={entry['offset']}-{entry['offset'] + entry['length'] - 1}"
+    try:
+        data = obj.get(Range=byte_range)['Body'].read()
+        record = json.loads(gzip.decompress(data).decode('utf-8'))
+    except ClientError as e:
+        # The part was replaced by a later compaction run (see compact.py)
+        if e.response.get('Error', {}).get('Code') in ['NoSuchKey', 'AccessDenied', 'InvalidRange']:
+            return None
+        raise
+    except (OSError, EOFError, ValueError):
+        # The range no longer holds a complete gzip member
+        return None
+    if record.get('file_id') != entry['file_id']:
+        return None
+    return record
+
+
+def get_archived_record(record_id):
+    """
+    Reads one record from the archives with a single ranged GET
+
+    If the cached index points to a part that a later compaction run replaced,
+    the index is read again and the lookup is retried once.
+
+    :param record_id: Google Drive file ID
+    :return: Dict with file_id, date and objects, or None if the record is not archived
+    """
+    entry = get_archive_index().get(record_id)
+    if entry is None:
+        return None
+    record = read_archive_entry(entry)
+    if record is None:
+        entry = get_archive_index(max_age=0).get(record_id)
+        record = read_archive_entry(entry) if entry is not None else None
+    if record is None or record['file_id'] != record_id:
+        return None
+    return record
+
+
+def get_from_archive(file_id, file_name):
+    """
+    Gets an object from the compacted archives, like `get_from_s3`
+
+    :param file_id: Google Drive file ID (or prefix)
+    :param file_name: Name of the object
+    :return: Content of the object or None if it is not archived
+    """
+    record_id, name = split_archive_path(file_id, file_name)
+    record = get_archived_record(record_id)
+    if record is None:
+        return None
+    return record['objects'].get(name)
+
+
+def iter_archive(since=None, until=None):
+    """
+    Reads all records from the archive partitions in a date range, one bulk GET per part file
+
+    Only the parts in the index are read, so parts being written by a compaction run are ignored.
+
+    :param since: First date to read (YYYY-MM-DD, inclusive)
+    :param until: Last date to read (YYYY-MM-DD, exclusive)
+    :return: Generator of dicts with file_id, date and objects
+    """
+    keys = sorted({
+        entry['key'] for entry in get_archive_index(max_age=0).values()
+        if (since is None or entry['date'] >= since) and (until is None or entry['date'] < until)
+    })
+    for key in keys:
+        obj = get_s3_resource().Object(os.environ.get('S3_BUCKET'), key)
+        data = gzip.decompress(obj.get()['Body'].read()).decode('utf-8')
+        for line in data.splitlines():
+            yield json.loads(line)
@@ -1,12 +1,25 @@
 import boto3
 import os
 import json
+import threading
+
+
+# boto3 resources are not thread-safe, so keep one per thread for the life of the process
+_local = threading.local()
+
+
+def get_sqs_resource():
+    if not hasattr(_local, 'sqs'):
+        _local.sqs = boto3.resource('sqs')
+    return _local.sqs
+
+
+def get_queue():
+    return get_sqs_resource().Queue(os.environ.get('SQS_QUEUE_URL'))
 
 
 def queue_message(message):
-    sqs = boto3.resource('sqs')
-    queue_url = os.environ.get('SQS_QUEUE_URL')
-    queue = sqs.Queue(queue_url)
+    queue = get_queue()
 
     if isinstance(message, dict):
         message = json.dumps(message)
@@ -14,3 +27,30 @@ def queue_message(message):
     response = queue.send_message(MessageBody=message)
     return response['MessageId']
 
+
+def receive_messages(max_messages=10, wait_time_seconds=20, visibility_timeout=600):
+    """
+    Long-polls the queue for messages
+
+    :param max_messages: Maximum number of messages to receive (1-10)
+    :param wait_time_seconds: How long to wait for messages to arrive (0-20)
+    :param visibility_timeout: How long the messages are hidden from other consumers
+    :return: List of SQS messages
+    """
+    return get_queue().receive_messages(
+        MaxNumberOfMessages=max_messages,
+        WaitTimeSeconds=wait_time_seconds,
+        VisibilityTimeout=visibility_timeout,
+        AttributeNames=['All'],
+    )
+
+
+def extend_message_visibility(message, visibility_timeout=600):
+    """
+    Hides a message from other consumers for another `visibility_timeout` seconds
+
+    :param message: SQS message being processed
+    :param visibility_timeout: Seconds from now until the message is visible again
+    :return: None
+    """
+    message.change_visibility(VisibilityTimeout=visibility_timeout)
@@ -1,9 +1,16 @@
 import tiktoken
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def get_encoding_for_model(model: str):
+    """Returns the tiktoken encoding of a model, loaded once per process."""
+    return tiktoken.encoding_for_model(model)
 
 
 def num_tokens_from_string(string: str, encoding_name: str) -> int:
     """Returns the number of tokens in a text string."""
-    encoding = tiktoken.encoding_for_model(encoding_name)
+    encoding = get_encoding_for_model(encoding_name)
     num_tokens = len(encoding.encode(string))
     return num_tokens
 
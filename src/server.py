@@ -14,6 +14,7 @@ This handler is invoked by:
 import os
 import json
 import traceback
+from functools import lru_cache
 from langchain_anthropic import ChatAnthropic
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -21,9 +22,13 @@ from urllib.parse import unquote_plus
 from libs.s3 import upload_to_s3, get_from_s3
 from libs.email import send_email
 from libs.llm import condense_transcript
-from libs.gdrive import get_drive_change_events, renew_drive_webhook_subscriptions, export_text, get_file_emails
+from libs.compress import compress_transcript
+from libs.gdrive import get_drive_change_events, renew_drive_webhook_subscriptions, export_text, get_file_emails, get_file_version
 from libs.sqs import queue_message
 from libs.prompt_hub import get_prompt
+from libs.checkpoint import content_hash, plan_resume, save_checkpoint
+from libs.ratelimit import rate_limited
+from libs.tokens import num_tokens_from_string
 
 
 HTML = f"""<HTML>
@@ -55,7 +60,8 @@ def handler(event, context):
             if 'body' in record:
                 if isinstance(record['body'], str):
                     record['body'] = json.loads(record['body'])
-                print(f"Processing SQS message ID {record['messageId']} for document ID {record['body']['id']}")
+                attempt = record.get('attributes', {}).get('ApproximateReceiveCount', '1')
+                print(f"Processing SQS message ID {record['messageId']} (attempt {attempt}) for document ID {record['body']['id']}")
                 handle_queued_event(record)
         return {
             "statusCode": 200,
@@ -147,6 +153,7 @@ def handle_queued_event(event):
     file_id = event["body"]["id"]
     owner_email = event["body"]["owner_email"]
     message = None
+    failed_emails = []
 
     # Get the list of participant emails
     participant_emails = get_file_emails(file_id, owner_email)
@@ -158,6 +165,7 @@ def handle_queued_event(event):
         except Exception as e:
             print(f"Error processing event with document ID {file_id} for participant {participant_email}: {e}")
             traceback.print_exc()
+            failed_emails.append(participant_email)
 
     # Return a response
     return {
@@ -170,17 +178,24 @@ def handle_queued_event(event):
             "owner_email": owner_email,
             "message": message,
             "participant_emails": participant_emails,
+            "failed_emails": failed_emails,
         }),
     }
 
 
+@lru_cache(maxsize=None)
+def get_summary_model() -> ChatAnthropic:
+    # Keep one client per process so warm workers reuse its HTTP connections.
+    # Retries are left to `rate_limited`, so a 429 pauses every worker right away
+    return ChatAnthropic(model="claude-sonnet-4-5", max_tokens=10000, temperature=0.4, max_retries=0)
+
+
 def get_email_key(email: str) -> str:
     return f"email_{email}".replace("@", "_").replace("+", "_").replace(".", "_").lower()
 
 
 def process_event_for_participant(event: dict, participant_email: str):
     file_id = event["body"]["id"]
-    owner_email = event["body"]["owner_email"]
     email_key = get_email_key(participant_email)
 
     # Check if we already emailed the user about this file
@@ -197,18 +212,50 @@ def process_event_for_participant(event: dict, participant_email: str):
             }),
         }
 
+    # Create the summary, or reuse the cached one
+    text_header, summary, _ = summarize_event(event)
+
+    # Send email with summary to user
+    return send_summary_email(event, participant_email, text_header, summary)
+
+
+def summarize_event(event: dict, force: bool = False):
+    """
+    Creates the summary of a meeting transcript, reusing the cached summary unless `force` is set
+
+    :param event: Queued event with the Google Drive file in `body`
+    :param force: Create a new summary even if one is cached (e.g. after a prompt or model change)
+    :return: Tuple of (text_header, summary, usage) where usage has estimated input and output tokens
+    """
+    file_id = event["body"]["id"]
+    owner_email = event["body"]["owner_email"]
+
     # Try to find cached final summary
-    summary = get_from_s3(file_id, "summary")
-    text_header = get_from_s3(file_id, "header")
+    summary = get_from_s3(file_id, "summary") if not force else None
+    text_header = get_from_s3(file_id, "header") if not force else None
+    usage = {"input_tokens": 0, "output_tokens": 0}
 
     # Create a summary it is not cached
     if summary is None or text_header is None:
 
+        # Skip the stages completed by a previous attempt on the same version of the file
+        version = get_file_version(file_id, owner_email)
+        plan = plan_resume(file_id, version)
+
         # Get text version of the file
-        text = export_text(file_id, owner_email)
+        text = plan["text"]
+        if text is None:
+            text = export_text(file_id, owner_email).decode("utf-8")
 
         # Extract attendees, header and main body from the Google Doc text
-        text_lines = text.decode("utf-8").splitlines()
+        text_lines = text.splitlines()
+        if len(text_lines) < 6:
+            raise ValueError(f"Document ID {file_id} is not a complete transcript ({len(text_lines)} lines)")
+
+        # Only checkpoint an export that has a header and attendees
+        if plan["text"] is None and version is not None:
+            save_checkpoint(file_id, "export", text, version)
+
         attendee_list = text_lines[2].split(", ")
         text_header = "\n".join([
             text_lines[0],
@@ -216,8 +263,13 @@ def process_event_for_participant(event: dict, participant_email: str):
             "Attendees:",
             text_lines[2],
         ])
-        text_body = text_lines[5:]
-        text_body = condense_transcript(text_body, attendee_list)
+        text_body = plan["condensed"]
+        if text_body is None:
+            text_body = condense_transcript(text_lines[5:], attendee_list)
+            save_checkpoint(file_id, "condensed", text_body, content_hash(text))
+
+        # Remove filler words, backchannel turns and repeated sentences
+        text_body, _ = compress_transcript(text_body)
 
         # Create the system prompt
         system = """You are a meeting assistant. You are given summaries of a meeting transcript and you need to combine and summarize all of them in 1-2 paragraphs.
@@ -241,10 +293,16 @@ Next Steps:
         system_prompt = get_prompt("meeting-summary-agent")
 
         prompt = ChatPromptTemplate.from_template(system_prompt if system_prompt != "" else system)
-        model = ChatAnthropic(model="claude-sonnet-4-5", max_tokens=10000, temperature=0.4)
+        model = get_summary_model()
         output_parser = StrOutputParser()
         chain = prompt | model | output_parser
-        summary = chain.invoke({"transcript": text_body})
+        # Claude has no tiktoken encoding, the GPT-4o count is close enough for rate limiting
+        tokens = num_tokens_from_string(prompt.format(transcript=text_body), "gpt-4o")
+        summary = rate_limited("anthropic", chain.invoke, {"transcript": text_body}, tokens=tokens)
+        usage = {
+            "input_tokens": tokens,
+            "output_tokens": num_tokens_from_string(summary, "gpt-4o"),
+        }
 
         # Extract text in <summary> tag
         if "<summary>" in summary and "</summary>" in summary:
@@ -254,6 +312,22 @@ Next Steps:
         upload_to_s3(file_id, "summary", summary)
         upload_to_s3(file_id, "header", text_header)
 
+    return text_header, summary, usage
+
+
+def send_summary_email(event: dict, participant_email: str, text_header: str, summary: str) -> str:
+    """
+    Sends the summary of a meeting to a participant and records the email in S3
+
+    :param event: Queued event with the Google Drive file in `body`
+    :param participant_email: Email address to send the summary to
+    :param text_header: Header with the meeting title and attendees
+    :param summary: Summary of the meeting
+    :return: Text of the email
+    """
+    file_id = event["body"]["id"]
+    email_key = get_email_key(participant_email)
+
     # Send email with summary to user
     message = "\n".join([
         text_header,
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+
+Long-running SQS worker for container deployments (e.g. ECS/Fargate).
+
+Runs the same `handle_queued_event` logic as the Lambda worker, but keeps
+clients, prompts and tokenizers warm for the life of the process:
+- Long-polls SQS and processes messages in a thread pool
+- Extends the visibility of messages while they are being processed
+- Stops polling on SIGTERM/SIGINT and drains the messages in flight
+
+"""
+
+import os
+import json
+import time
+import signal
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from server import handle_queued_event
+from libs.sqs import receive_messages, extend_message_visibility
+
+
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", 4))
+WAIT_TIME_SECONDS = int(os.environ.get("SQS_WAIT_TIME_SECONDS", 20))
+VISIBILITY_TIMEOUT = int(os.environ.get("SQS_VISIBILITY_TIMEOUT", 600))
+HEARTBEAT_SECONDS = int(os.environ.get("SQS_HEARTBEAT_SECONDS", VISIBILITY_TIMEOUT // 3))
+# The queue has no dead-letter queue, so give up on a message after this many attempts
+MAX_ATTEMPTS = int(os.environ.get("SQS_MAX_ATTEMPTS", 5))
+
+shutdown = threading.Event()
+in_flight = {}
+in_flight_lock = threading.Lock()
+
+
+def to_record(message) -> dict:
+    # Use the same shape as the records of a Lambda SQS event
+    return {
+        "messageId": message.message_id,
+        "receiptHandle": message.receipt_handle,
+        "body": json.loads(message.body),
+        "attributes": message.attributes or {},
+    }
+
+
+def get_attempt(message) -> int:
+    return int((message.attributes or {}).get("ApproximateReceiveCount", "1"))
+
+
+def give_up_or_retry(message, reason):
+    # Leave the message on the queue to be redelivered after the visibility timeout,
+    # unless it already failed MAX_ATTEMPTS times
+    attempt = get_attempt(message)
+    if attempt >= MAX_ATTEMPTS:
+        print(f"Giving up on SQS message ID {message.message_id} after {attempt} attempts ({reason}): {message.body}")
+        message.delete()
+    else:
+        print(f"Leaving SQS message ID {message.message_id} on the queue after attempt {attempt} ({reason})")
+
+
+def process_message(message):
+    try:
+        record = to_record(message)
+        print(f"Processing SQS message ID {record['messageId']} (attempt {get_attempt(message)}) for document ID {record['body']['id']}")
+        response = handle_queued_event(record)
+
+        # Participants that were already emailed are skipped when the message is redelivered
+        failed_emails = json.loads(response["body"]).get("failed_emails", [])
+        if len(failed_emails) > 0:
+            give_up_or_retry(message, f"failed for {failed_emails}")
+        else:
+            message.delete()
+    except Exception as e:
+        print(f"Error processing SQS message ID {message.message_id}: {e}")
+        traceback.print_exc()
+        try:
+            give_up_or_retry(message, f"{e}")
+        except Exception as delete_error:
+            print(f"Error deleting SQS message ID {message.message_id}: {delete_error}")
+    finally:
+        with in_flight_lock:
+            in_flight.pop(message.message_id, None)
+
+
+def heartbeat():
+    # Keep extending the visibility of messages in flight until the worker has drained
+    while not shutdown.is_set() or len(in_flight) > 0:
+        time.sleep(1)
+        now = time.time()
+        with in_flight_lock:
+            messages = list(in_flight.values())
+        for entry in messages:
+            if now - entry["extended_at"] < HEARTBEAT_SECONDS:
+                continue
+            try:
+                extend_message_visibility(entry["message"], VISIBILITY_TIMEOUT)
+                entry["extended_at"] = now
+            except Exception as e:
+                print(f"Error extending visibility of SQS message ID {entry['message'].message_id}: {e}")
+
+
+def handle_signal(signum, frame):
+    print(f"Received signal {signum}, draining {len(in_flight)} messages in flight")
+    shutdown.set()
+
+
+def main():
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+
+    print(f"Polling {os.environ.get('SQS_QUEUE_URL')} with {WORKER_THREADS} threads")
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS) as executor:
+        while not shutdown.is_set():
+            # Only take as many messages as there are idle threads
+            available = WORKER_THREADS - len(in_flight)
+            if available <= 0:
+                time.sleep(1)
+                continue
+            try:
+                messages = receive_messages(min(10, available), WAIT_TIME_SECONDS, VISIBILITY_TIMEOUT)
+            except Exception as e:
+                print(f"Error receiving SQS messages: {e}")
+                time.sleep(5)
+                continue
+            for message in messages:
+                with in_flight_lock:
+                    in_flight[message.message_id] = {"message": message, "extended_at": time.time()}
+                executor.submit(process_message, message)
+
+    heartbeat_thread.join()
+    print("Drained all messages, exiting")
+
+
+if __name__ == "__main__":
+    main()